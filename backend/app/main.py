@@ -16,7 +16,7 @@ except (ValueError, ImportError) as e:
     print(f"⚠️  Curation router not available: {e}")
     CURATION_AVAILABLE = False
 from app.database import Base, engine, init_database, check_database_connection
-from app.services.presence_manager import start_presence_cleanup_task
+from app.services.presence_manager import presence_manager, start_presence_cleanup_task
 from app.services.websocket_manager import websocket_manager
 from app.services.heartbeat_manager import get_heartbeat_manager
 from app.services.presence_metrics import presence_metrics
@@ -104,6 +104,9 @@ async def shutdown_event():
     # Stop presence metrics collection
     await presence_metrics.stop_metrics_collection()
     
+    # Send any presence events still waiting for their batch window
+    await presence_manager.shutdown()
+    
     print("🛑 VectorSpace API shutdown complete")
 
 # Serve frontend static files in production
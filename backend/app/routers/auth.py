@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials
@@ -78,8 +79,9 @@ async def login(user_data: UserLogin, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(User).where(User.username == user_data.username))
     user = result.scalar_one_or_none()
     
-    # Verify credentials
-    if not user or not user.verify_password(user_data.password):
+    # Verify credentials; bcrypt runs in a worker thread so concurrent
+    # logins don't serialize on the event loop
+    if not user or not await asyncio.to_thread(user.verify_password, user_data.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password"
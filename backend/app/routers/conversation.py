@@ -13,6 +13,7 @@ from app.schemas.conversation import (
 from app.services.vector_service import vector_service
 from app.services.summary_service import SummaryService
 from app.services.corpus_service import corpus_service
+from app.services.websocket_manager import websocket_manager
 from app.auth import get_current_user
 
 router = APIRouter()
@@ -412,6 +413,7 @@ async def leave_conversation(
     # Remove participant
     await db.delete(participant)
     await db.commit()
+    websocket_manager.invalidate_participant(conversation_id, current_user.id)
     
     return SuccessResponse(
         message="Successfully left conversation",
@@ -557,6 +559,7 @@ async def delete_conversation(
         # Delete the conversation
         await db.delete(conversation)
         await db.commit()
+        websocket_manager.invalidate_participant(conversation_id)
         
     except Exception as e:
         await db.rollback()
@@ -150,16 +150,29 @@ async def conversation_websocket(
             await presence_manager.user_left_conversation(conversation_id, user.id)
 
 
-async def ensure_participant_record(user_id: int, conversation_id: int, db: AsyncSession):
-    """Ensure user has a participant record for the conversation."""
-    # Check if participant record exists
+async def get_participant_role(user_id: int, conversation_id: int, db: AsyncSession) -> Optional[str]:
+    """Get the user's participant role, served from the connection manager's cache when loaded."""
+    role = websocket_manager.get_participant_role(conversation_id, user_id)
+    if role:
+        return role
+    
     participant_result = await db.execute(
         select(ConversationParticipant)
         .where(ConversationParticipant.conversation_id == conversation_id)
         .where(ConversationParticipant.user_id == user_id)
     )
+    participant = participant_result.scalar_one_or_none()
+    if not participant:
+        return None
     
-    if not participant_result.scalar_one_or_none():
+    websocket_manager.cache_participant_role(conversation_id, user_id, participant.role)
+    return participant.role
+
+
+async def ensure_participant_record(user_id: int, conversation_id: int, db: AsyncSession):
+    """Ensure user has a participant record for the conversation."""
+    # Check if participant record exists
+    if not await get_participant_role(user_id, conversation_id, db):
         # Get conversation to check ownership
         conversation_result = await db.execute(
             select(Conversation).where(Conversation.id == conversation_id)
@@ -177,6 +190,7 @@ async def ensure_participant_record(user_id: int, conversation_id: int, db: Asyn
         )
         db.add(participant)
         await db.commit()
+        websocket_manager.cache_participant_role(conversation_id, user_id, role)
 
 
 async def handle_websocket_message(
@@ -624,25 +638,19 @@ async def validate_parent_message(parent_message_id: int, conversation_id: int,
 async def route_message_by_context(user: User, conversation_id: int, message: Message, db: AsyncSession):
     """Route message based on user role and conversation context."""
     try:
-        # Get conversation to check ownership
+        # Participant role is cached on connect, so owners' messages skip the database entirely
+        role = await get_participant_role(user.id, conversation_id, db)
+        if role != "visitor" or message.message_type != "chat":
+            return
+        
+        # Get conversation to find the owner
         conversation_result = await db.execute(
             select(Conversation).where(Conversation.id == conversation_id)
         )
         conversation = conversation_result.scalar_one()
         
-        # Get user's participant role
-        participant_result = await db.execute(
-            select(ConversationParticipant).where(
-                ConversationParticipant.conversation_id == conversation_id,
-                ConversationParticipant.user_id == user.id
-            )
-        )
-        participant = participant_result.scalar_one_or_none()
-        
         # If user is visitor and conversation owner is different, mark as visitor message
-        if (participant and participant.role == "visitor" and 
-            conversation.user_id != user.id and 
-            message.message_type == "chat"):
+        if conversation.user_id != user.id:
             
             # Send notification to conversation owner if they're connected
             await websocket_manager.send_to_user(conversation.user_id, {
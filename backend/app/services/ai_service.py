@@ -1,11 +1,11 @@
 from typing import AsyncGenerator, Optional, Dict, Any, List
+from functools import cached_property
 import asyncio
 import random
 import string
 import json
 import logging
 import os
-from openai import AsyncOpenAI
 
 logger = logging.getLogger(__name__)
 
@@ -14,33 +14,44 @@ class AIService:
     """Service for integrating with AI providers for chatbot responses."""
     
     def __init__(self):
-        """Initialize AI service with OpenAI client."""
+        """Initialize AI service settings; the OpenAI client is built on first use."""
         self.api_key = os.getenv("OPENAI_API_KEY")
         if not self.api_key:
             logger.warning("OPENAI_API_KEY not found, falling back to mock mode")
-            self.client = None
             self.model = "mock-ai-model"
         else:
-            # Configure client with Railway-optimized settings
-            import httpx
-            http_client = httpx.AsyncClient(
-                timeout=60.0,
-                limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
-                verify=True  # Ensure SSL verification
-            )
-            # Use proxy if configured, otherwise direct OpenAI
-            base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
-            self.client = AsyncOpenAI(
-                api_key=self.api_key,
-                base_url=base_url,
-                timeout=60.0,  # Increase timeout for Railway networking
-                max_retries=3,  # Add retries for connection issues
-                http_client=http_client
-            )
             self.model = os.getenv("AI_MODEL", "gpt-4o-mini")
         
         self.max_tokens = int(os.getenv("AI_MAX_TOKENS", "4000"))
         self.temperature = float(os.getenv("AI_TEMPERATURE", "0.7"))
+    
+    @cached_property
+    def client(self):
+        """OpenAI client, or None in mock mode.
+        
+        Built lazily so importing the module (and tests that never reach the
+        API) skip the openai/httpx client construction.
+        """
+        if not self.api_key:
+            return None
+        
+        # Configure client with Railway-optimized settings
+        import httpx
+        from openai import AsyncOpenAI
+        http_client = httpx.AsyncClient(
+            timeout=60.0,
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+            verify=True  # Ensure SSL verification
+        )
+        # Use proxy if configured, otherwise direct OpenAI
+        base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+        return AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=base_url,
+            timeout=60.0,  # Increase timeout for Railway networking
+            max_retries=3,  # Add retries for connection issues
+            http_client=http_client
+        )
         
     async def stream_response(
         self, 
@@ -328,20 +339,24 @@ class AIService:
         Get conversation context within token limit.
         
         Returns recent messages that fit within the token limit.
+        Each message is tokenized exactly once while scanning backwards
+        with a running token total.
         """
         context_messages = []
         current_tokens = 0
-        
+
         # Process messages in reverse order (most recent first)
         for message in reversed(messages):
             message_tokens = self.estimate_tokens(message["content"])
-            
+
             if current_tokens + message_tokens > max_context_tokens:
                 break
-            
-            context_messages.insert(0, message)  # Insert at beginning to maintain order
+
+            context_messages.append(message)
             current_tokens += message_tokens
-        
+
+        # Restore chronological order in one pass instead of inserting at the front
+        context_messages.reverse()
         return context_messages
 
     async def generate_embedding(self, text: str) -> List[float]:
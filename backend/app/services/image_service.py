@@ -37,21 +37,22 @@ class ImageService:
             if image.format not in self.allowed_formats:
                 raise ValueError(f"Unsupported format. Allowed: {', '.join(self.allowed_formats)}")
             
-            # Convert to RGB if necessary (for JPEG compatibility)
-            if image.mode in ("RGBA", "P", "L"):
+            # Flatten transparency onto white (for JPEG compatibility)
+            if image.mode in ("RGBA", "P"):
                 # Create white background for transparency
                 background = Image.new("RGB", image.size, (255, 255, 255))
-                if image.mode == "P":
-                    image = image.convert("RGBA")
-                if image.mode == "RGBA":
-                    background.paste(image, mask=image.split()[-1])  # Use alpha channel as mask
-                    image = background
-                else:
-                    image = image.convert("RGB")
+                image = image.convert("RGBA")
+                background.paste(image, mask=image.split()[-1])  # Use alpha channel as mask
+                image = background
             
             # Create thumbnail maintaining aspect ratio
             image.thumbnail(self.thumbnail_size, Image.Resampling.LANCZOS)
             
+            # Grayscale is widened to RGB only after thumbnailing, so JPEG
+            # decoding can still downscale and the conversion stays small
+            if image.mode == "L":
+                image = image.convert("RGB")
+            
             # Center crop to exact square if needed
             if image.size != self.thumbnail_size:
                 image = self._center_crop_square(image, self.thumbnail_size[0])
@@ -97,9 +98,11 @@ class ImageService:
             if not base64_string.startswith("data:image/"):
                 return False
             
-            # Extract base64 data
-            header, data = base64_string.split(",", 1)
-            image_bytes = base64.b64decode(data)
+            # Extract base64 data; reject empty or non-base64 payloads before Pillow sees them
+            header, _, data = base64_string.partition(",")
+            if not data:
+                return False
+            image_bytes = base64.b64decode(data, validate=True)
             
             # Try to open as image
             image = Image.open(io.BytesIO(image_bytes))
@@ -198,10 +201,8 @@ class ImageService:
             y_start = i * stripe_height
             y_end = (i + 1) * stripe_height if i < num_stripes - 1 else size[1]
             
-            # Create stripe
-            for y in range(y_start, y_end):
-                for x in range(size[0]):
-                    image.putpixel((x, y), color)
+            # Fill the stripe in one call rather than pixel by pixel
+            image.paste(color, (0, y_start, size[0], y_end))
         
         # Convert to base64
         output_buffer = io.BytesIO()
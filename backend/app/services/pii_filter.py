@@ -26,6 +26,10 @@ class PIIFilter:
             re.IGNORECASE
         )
         
+        # Every pattern needs an "@", a "://" or a digit to match; most
+        # conversation text has none of them and can skip the regex passes
+        self.digit_pattern = re.compile(r'\d')
+        
         # Simple address pattern (matches common street address formats)
         self.address_pattern = re.compile(
             r'\b\d+\s+[A-Za-z\s]+(?:Street|St|Avenue|Ave|Road|Rd|Drive|Dr|Lane|Ln|Boulevard|Blvd|Way|Place|Pl|Court|Ct)\.?(?:\s*(?:Apt|Apartment|Suite|Ste|Unit|#)\s*\w+)?\b',
@@ -45,17 +49,28 @@ class PIIFilter:
         if not text:
             return ""
         
+        # Each pattern only runs when its literal anchor is present: emails
+        # need "@", URLs "://", phone numbers and addresses a digit. None of
+        # the placeholders contain an anchor, so checking up front is safe.
+        has_email = "@" in text
+        has_url = "://" in text
+        has_digit = self.digit_pattern.search(text) is not None
+        
         # Filter emails
-        text = self.email_pattern.sub("[email]", text)
+        if has_email:
+            text = self.email_pattern.sub("[email]", text)
         
         # Filter phone numbers
-        for phone_pattern in self.phone_patterns:
-            text = phone_pattern.sub("[phone]", text)
+        if has_digit:
+            for phone_pattern in self.phone_patterns:
+                text = phone_pattern.sub("[phone]", text)
         
         # Filter URLs
-        text = self.url_pattern.sub("[link]", text)
+        if has_url:
+            text = self.url_pattern.sub("[link]", text)
         
         # Filter addresses
-        text = self.address_pattern.sub("[address]", text)
+        if has_digit:
+            text = self.address_pattern.sub("[address]", text)
         
         return text
\ No newline at end of file
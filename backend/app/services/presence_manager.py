@@ -1,9 +1,12 @@
 from typing import Dict, Set, List, Optional
 import asyncio
+import logging
 import time
 from dataclasses import dataclass
 from app.services.websocket_manager import websocket_manager
 
+logger = logging.getLogger(__name__)
+
 
 @dataclass
 class PresenceInfo:
@@ -16,9 +19,17 @@ class PresenceInfo:
 class PresenceManager:
     """Manages user presence information for conversations."""
     
-    def __init__(self):
+    def __init__(self, flush_interval: float = 0.01, max_batch_size: int = 50):
         # conversation_id -> {user_id -> PresenceInfo}
         self._presence_data: Dict[int, Dict[int, PresenceInfo]] = {}
+        
+        # Presence events arriving within flush_interval are coalesced into one frame
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        # conversation_id -> pending presence_update events
+        self._pending_events: Dict[int, List[Dict]] = {}
+        # conversation_id -> scheduled flush task
+        self._flush_tasks: Dict[int, asyncio.Task] = {}
     
     async def user_joined_conversation(self, conversation_id: int, user_id: int, username: str) -> None:
         """Record that a user has joined a conversation."""
@@ -36,7 +47,7 @@ class PresenceManager:
         )
         
         # Broadcast presence update to conversation participants
-        await websocket_manager.broadcast_to_conversation(conversation_id, {
+        await self._queue_presence_event(conversation_id, {
             "type": "presence_update",
             "user_id": user_id,
             "username": username,
@@ -58,11 +69,12 @@ class PresenceManager:
         del self._presence_data[conversation_id][user_id]
         
         # Clean up empty conversation data
-        if not self._presence_data[conversation_id]:
+        conversation_empty = not self._presence_data[conversation_id]
+        if conversation_empty:
             del self._presence_data[conversation_id]
         
         # Broadcast presence update to conversation participants
-        await websocket_manager.broadcast_to_conversation(conversation_id, {
+        await self._queue_presence_event(conversation_id, {
             "type": "presence_update",
             "user_id": user_id,
             "username": presence_info.username,
@@ -70,6 +82,71 @@ class PresenceManager:
             "conversation_id": conversation_id,
             "timestamp": time.time()
         })
+        
+        # Last participant gone: flush now rather than leave a timer behind
+        if conversation_empty:
+            await self.flush_presence_events(conversation_id)
+    
+    async def _queue_presence_event(self, conversation_id: int, event: Dict) -> None:
+        """Queue a presence event for the next batched broadcast to the conversation."""
+        pending = self._pending_events.setdefault(conversation_id, [])
+        pending.append(event)
+        
+        if len(pending) >= self.max_batch_size:
+            await self.flush_presence_events(conversation_id)
+        elif conversation_id not in self._flush_tasks:
+            task = asyncio.create_task(self._delayed_flush(conversation_id))
+            task.add_done_callback(lambda t: self._on_flush_done(conversation_id, t))
+            self._flush_tasks[conversation_id] = task
+    
+    async def _delayed_flush(self, conversation_id: int) -> None:
+        """Flush a conversation's pending presence events after the batching window."""
+        await asyncio.sleep(self.flush_interval)
+        await self.flush_presence_events(conversation_id)
+    
+    def _on_flush_done(self, conversation_id: int, task: asyncio.Task) -> None:
+        """Forget a finished flush task and log any error it raised."""
+        if self._flush_tasks.get(conversation_id) is task:
+            del self._flush_tasks[conversation_id]
+        
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(
+                f"Error flushing presence events for conversation {conversation_id}: {task.exception()}"
+            )
+    
+    async def flush_presence_events(self, conversation_id: int) -> int:
+        """Broadcast pending presence events now. Returns count of successful sends.
+        
+        A single event goes out as a plain presence_update frame; several
+        events are sent as one presence_batch frame per recipient.
+        """
+        flush_task = self._flush_tasks.pop(conversation_id, None)
+        if flush_task and flush_task is not asyncio.current_task():
+            flush_task.cancel()
+        
+        events = self._pending_events.pop(conversation_id, [])
+        if not events:
+            return 0
+        
+        if len(events) == 1:
+            message = events[0]
+        else:
+            message = {
+                "type": "presence_batch",
+                "conversation_id": conversation_id,
+                "events": events
+            }
+        
+        return await websocket_manager.broadcast_to_conversation(conversation_id, message)
+    
+    async def shutdown(self) -> None:
+        """Flush all pending presence events and stop their scheduled flushes."""
+        for conversation_id in list(self._pending_events):
+            await self.flush_presence_events(conversation_id)
+        
+        for task in list(self._flush_tasks.values()):
+            task.cancel()
+        self._flush_tasks.clear()
     
     async def update_user_activity(self, conversation_id: int, user_id: int) -> None:
         """Update user's last seen timestamp."""
@@ -146,6 +223,7 @@ class PresenceManager:
         return {
             "total_conversations": total_conversations,
             "total_users": total_users,
+            "pending_presence_events": sum(len(events) for events in self._pending_events.values()),
             "conversations": {
                 conv_id: len(participants)
                 for conv_id, participants in self._presence_data.items()
@@ -1,9 +1,25 @@
+import re
 from typing import Optional, List
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.models import Conversation, Message
 from app.services.pii_filter import PIIFilter
 
+# Common technical keywords to look for, compiled once at import
+TECH_TERM_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in (
+        r'\b(?:API|REST|GraphQL|JSON|XML|HTTP|HTTPS|WebSocket|OAuth|JWT)\b',
+        r'\b(?:React|Vue|Angular|JavaScript|TypeScript|Node\.js|Python|Java|Go|Rust)\b',
+        r'\b(?:Docker|Kubernetes|AWS|Azure|GCP|CI\/CD|Git|GitHub)\b',
+        r'\b(?:database|SQL|NoSQL|MongoDB|PostgreSQL|MySQL|Redis)\b',
+        r'\b(?:machine learning|AI|neural network|deep learning|algorithm)\b',
+        r'\b(?:frontend|backend|fullstack|microservices|serverless)\b',
+        r'\b(?:performance|optimization|security|authentication|authorization)\b',
+        r'\b(?:testing|debugging|deployment|monitoring|logging)\b'
+    )
+]
+
 
 class SummaryService:
     """Service for generating conversation summaries."""
@@ -46,21 +62,28 @@ class SummaryService:
         summary = await self.generate_summary(conversation_id, db)
         
         if summary:
-            # Store both raw and filtered versions
+            # Resolve the title before any write, so title generation (which
+            # may call the AI service) never runs with the summary pending
+            new_title = None
+            if update_title:
+                try:
+                    new_title = await self._resolve_conversation_title(conversation_id, summary, db)
+                except Exception as e:
+                    print(f"Error resolving title in check_and_generate_summary: {e}")
+            
+            # Store title and both summary versions in a single commit
+            if new_title:
+                conversation.title = new_title  # type: ignore
             conversation.summary_raw = summary  # type: ignore
             conversation.summary_public = self.pii_filter.filter_text(summary)
             await db.commit()
             
+            if new_title:
+                print(f"Updated title for conversation {conversation_id}: {new_title}")
+            
             # Generate and store embedding in ChromaDB
             await self._store_embedding(conversation, summary, db)
             
-            # Update conversation title based on new summary
-            if update_title:
-                try:
-                    await self._update_conversation_title(conversation_id, summary, db)
-                except Exception as e:
-                    print(f"Error updating title in check_and_generate_summary: {e}")
-            
             return summary
         
         return None
@@ -108,8 +131,9 @@ class SummaryService:
         
         # Add primary topic from first user message
         first_user_msg = user_messages[0]
-        if len(first_user_msg.split()) > 3:
-            summary_parts.append(f"Discussion about {' '.join(first_user_msg.split()[:10])}")
+        first_user_words = first_user_msg.split()
+        if len(first_user_words) > 3:
+            summary_parts.append(f"Discussion about {' '.join(first_user_words[:10])}")
         else:
             summary_parts.append(first_user_msg)
         
@@ -135,26 +159,11 @@ class SummaryService:
     
     def _extract_key_terms(self, text: str) -> List[str]:
         """Extract key technical terms and topics from conversation text."""
-        import re
-        
-        # Common technical keywords to look for
-        tech_patterns = [
-            r'\b(?:API|REST|GraphQL|JSON|XML|HTTP|HTTPS|WebSocket|OAuth|JWT)\b',
-            r'\b(?:React|Vue|Angular|JavaScript|TypeScript|Node\.js|Python|Java|Go|Rust)\b',
-            r'\b(?:Docker|Kubernetes|AWS|Azure|GCP|CI\/CD|Git|GitHub)\b',
-            r'\b(?:database|SQL|NoSQL|MongoDB|PostgreSQL|MySQL|Redis)\b',
-            r'\b(?:machine learning|AI|neural network|deep learning|algorithm)\b',
-            r'\b(?:frontend|backend|fullstack|microservices|serverless)\b',
-            r'\b(?:performance|optimization|security|authentication|authorization)\b',
-            r'\b(?:testing|debugging|deployment|monitoring|logging)\b'
-        ]
-        
         found_terms = []
         text_lower = text.lower()
         
-        for pattern in tech_patterns:
-            matches = re.findall(pattern, text_lower, re.IGNORECASE)
-            found_terms.extend(matches)
+        for pattern in TECH_TERM_PATTERNS:
+            found_terms.extend(pattern.findall(text_lower))
         
         # Remove duplicates and return most common terms
         unique_terms = list(set(found_terms))
@@ -182,19 +191,25 @@ class SummaryService:
             conversation = await db.get(Conversation, conversation_id)
             
             if conversation:
+                # Resolve the title before any write; it is committed with the summary
+                new_title = None
+                if update_title:
+                    try:
+                        new_title = await self._resolve_conversation_title(conversation_id, summary, db)
+                    except Exception as e:
+                        print(f"Error resolving title in force_generate_summary: {e}")
+                
+                if new_title:
+                    conversation.title = new_title  # type: ignore
                 conversation.summary_raw = summary  # type: ignore
                 conversation.summary_public = self.pii_filter.filter_text(summary)
                 await db.commit()
                 
+                if new_title:
+                    print(f"Updated title for conversation {conversation_id}: {new_title}")
+                
                 # Generate and store embedding
                 await self._store_embedding(conversation, summary, db)
-                
-                # Update conversation title based on new summary
-                if update_title:
-                    try:
-                        await self._update_conversation_title(conversation_id, summary, db)
-                    except Exception as e:
-                        print(f"Error updating title in force_generate_summary: {e}")
         
         return summary
     
@@ -239,17 +254,20 @@ class SummaryService:
         if len(text) <= max_length:
             return text
         
-        # Find the last space within max_length
-        truncated = text[:max_length]
-        last_space = truncated.rfind(' ')
-        
-        if last_space > 0:
-            truncated = truncated[:last_space]
+        # Find the last space within max_length without copying the prefix first
+        last_space = text.rfind(' ', 0, max_length)
+        cut = last_space if last_space > 0 else max_length
         
-        return truncated + "..."
+        return text[:cut] + "..."
     
-    async def _update_conversation_title(self, conversation_id: int, summary: str, db: AsyncSession):
-        """Update conversation title based on new summary."""
+    async def _resolve_conversation_title(self, conversation_id: int, summary: str, db: AsyncSession) -> Optional[str]:
+        """Work out the conversation's new title from the summary.
+        
+        Nothing is written here; the caller assigns the returned title and
+        commits it together with the summary.
+        
+        Returns the title to apply, or None to keep the current one.
+        """
         try:
             from app.services.title_service import title_service
             
@@ -261,20 +279,19 @@ class SummaryService:
                 new_title = await title_service.generate_title_from_messages(conversation_id, db)
             
             if new_title:
-                # Get conversation and update title
                 conversation = await db.get(Conversation, conversation_id)
                 
                 if conversation and new_title != conversation.title:
                     # Only update if title appears to be auto-generated (not custom)
                     if not title_service._is_custom_title(conversation.title):  # type: ignore
-                        conversation.title = new_title  # type: ignore
-                        await db.commit()
-                        print(f"Updated title for conversation {conversation_id}: {new_title}")
+                        return new_title
                     else:
                         print(f"Skipped title update for conversation {conversation_id} (custom title detected)")
         
         except Exception as e:
-            print(f"Error updating conversation title: {e}")
+            print(f"Error resolving conversation title: {e}")
+        
+        return None
 
 
 # Global instance
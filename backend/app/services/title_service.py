@@ -1,9 +1,16 @@
+import re
 from typing import Optional, List
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.models import Conversation, Message
 from app.services.ai_service import ai_service
 
+# Generic date-based titles that were not customized by the user
+DEFAULT_TITLE_PATTERN = re.compile(
+    r'Chat \d{4}-\d{2}-\d{2}|Chat \d{1,2}/\d{1,2}/\d{4}|New Conversation',
+    re.IGNORECASE
+)
+
 
 class TitleGenerationService:
     """Service for generating conversation titles based on content."""
@@ -121,9 +128,7 @@ class TitleGenerationService:
     def _is_custom_title(self, title: str) -> bool:
         """Check if title appears to be manually customized."""
         # Check for generic date-based titles
-        import re
-        date_pattern = r'Chat \d{4}-\d{2}-\d{2}|Chat \d{1,2}/\d{1,2}/\d{4}|New Conversation'
-        return not re.search(date_pattern, title, re.IGNORECASE)
+        return not DEFAULT_TITLE_PATTERN.search(title)
     
     async def _generate_ai_title(self, messages: List[Message]) -> Optional[str]:
         """Generate title using AI service."""
@@ -51,6 +51,7 @@ class VectorService:
         """
         self.persist_directory = persist_directory
         self.collection_name = collection_name
+        self._collection = None
         
         # Initialize ChromaDB client
         self.client = chromadb.PersistentClient(path=persist_directory)
@@ -93,17 +94,26 @@ class VectorService:
         return processed
     
     def get_or_create_collection(self):
-        """Get or create the ChromaDB collection."""
+        """Get or create the ChromaDB collection.
+        
+        The collection handle is cached after the first call, since every
+        vector operation goes through here and each lookup is a round trip
+        to Chroma's metadata store.
+        """
+        if self._collection is not None:
+            return self._collection
+        
         # For testing, create collection without embedding function to avoid issues
         if os.getenv("TESTING") == "1":
-            return self.client.get_or_create_collection(
+            self._collection = self.client.get_or_create_collection(
                 name=self.collection_name
             )
         else:
-            return self.client.get_or_create_collection(
+            self._collection = self.client.get_or_create_collection(
                 name=self.collection_name,
                 embedding_function=self.embedding_function
             )
+        return self._collection
     
     def add_conversation_summary(
         self,
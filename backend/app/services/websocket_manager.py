@@ -29,7 +29,10 @@ class ConnectionInfo:
 class ConversationWebSocketManager:
     """Manages WebSocket connections for real-time conversation features."""
     
-    def __init__(self):
+    def __init__(self, broadcast_batch_size: int = 50):
+        # Maximum number of concurrent sends per broadcast batch
+        self.broadcast_batch_size = broadcast_batch_size
+        
         # conversation_id -> List[ConnectionInfo]
         self.active_connections: Dict[int, List[ConnectionInfo]] = {}
         
@@ -38,6 +41,9 @@ class ConversationWebSocketManager:
         
         # connection_id -> ConnectionInfo (for quick lookup)
         self.connection_lookup: Dict[str, ConnectionInfo] = {}
+        
+        # conversation_id -> {user_id: participant role}, kept while the conversation has connections
+        self.participant_roles: Dict[int, Dict[int, str]] = {}
     
     async def connect(self, websocket: WebSocket, conversation_id: int, user_id: int, username: str) -> str:
         """Connect a user to a conversation via WebSocket."""
@@ -86,6 +92,7 @@ class ConversationWebSocketManager:
             # Clean up empty conversation lists
             if not self.active_connections[conversation_id]:
                 del self.active_connections[conversation_id]
+                self.participant_roles.pop(conversation_id, None)
         
         # Remove from user connections
         if user_id in self.user_connections:
@@ -103,12 +110,16 @@ class ConversationWebSocketManager:
     
     async def send_to_connection(self, connection_id: str, message: dict):
         """Send a message to a specific connection."""
+        return await self._send_payload(connection_id, json.dumps(message))
+    
+    async def _send_payload(self, connection_id: str, payload: str) -> bool:
+        """Send an already-serialized message to a specific connection."""
         if connection_id not in self.connection_lookup:
             return False
         
         connection = self.connection_lookup[connection_id]
         try:
-            await connection.websocket.send_text(json.dumps(message))
+            await connection.websocket.send_text(payload)
             connection.update_last_seen()
             return True
         except Exception as e:
@@ -140,18 +151,45 @@ class ConversationWebSocketManager:
         if conversation_id not in self.active_connections:
             return 0
         
+        # Serialize once and reuse the payload for every recipient
+        payload = json.dumps(message)
         sent_count = 0
-        connections = list(self.active_connections[conversation_id])  # Copy to avoid modification during iteration
-        
-        for connection in connections:
-            if exclude_connection_id and connection.connection_id == exclude_connection_id:
-                continue
-            
-            if await self.send_to_connection(connection.connection_id, message):
-                sent_count += 1
+        connection_ids = [
+            connection.connection_id
+            for connection in self.active_connections[conversation_id]  # Copy to avoid modification during iteration
+            if connection.connection_id != exclude_connection_id
+        ]
+        
+        # Fan out concurrently in bounded batches, yielding to the event loop
+        # between batches so large conversations don't starve other tasks
+        for start in range(0, len(connection_ids), self.broadcast_batch_size):
+            if start:
+                await asyncio.sleep(0)
+            batch = connection_ids[start:start + self.broadcast_batch_size]
+            results = await asyncio.gather(
+                *(self._send_payload(connection_id, payload) for connection_id in batch)
+            )
+            sent_count += sum(1 for sent in results if sent)
         
         return sent_count
     
+    def get_participant_role(self, conversation_id: int, user_id: int) -> Optional[str]:
+        """Get a user's cached participant role, or None if it has not been loaded."""
+        return self.participant_roles.get(conversation_id, {}).get(user_id)
+    
+    def cache_participant_role(self, conversation_id: int, user_id: int, role: str):
+        """Remember a user's participant role while the conversation has live connections."""
+        if conversation_id not in self.active_connections:
+            return
+        self.participant_roles.setdefault(conversation_id, {})[user_id] = role
+    
+    def invalidate_participant(self, conversation_id: int, user_id: Optional[int] = None):
+        """Drop cached participant roles after a membership change; all users if user_id is None."""
+        if user_id is None:
+            self.participant_roles.pop(conversation_id, None)
+        elif conversation_id in self.participant_roles:
+            self.participant_roles[conversation_id].pop(user_id, None)
+    
     def get_conversation_participants(self, conversation_id: int) -> List[Dict]:
         """Get list of currently connected participants in a conversation."""
         if conversation_id not in self.active_connections:
@@ -183,18 +183,19 @@ class TestAuthEndpoints:
                 "password": "password123"
             })
             token = login_response.json()["access_token"]
+            auth_headers = {"Authorization": f"Bearer {token}"}
             
             # Verify token works
             me_response = await client.get(
                 "/api/auth/me",
-                headers={"Authorization": f"Bearer {token}"}
+                headers=auth_headers
             )
             assert me_response.status_code == 200
             
             # Logout
             logout_response = await client.post(
                 "/api/auth/logout",
-                headers={"Authorization": f"Bearer {token}"}
+                headers=auth_headers
             )
             assert logout_response.status_code == 200
             assert "logged out" in logout_response.json()["message"]
@@ -202,7 +203,7 @@ class TestAuthEndpoints:
             # Verify token no longer works
             me_response_after = await client.get(
                 "/api/auth/me",
-                headers={"Authorization": f"Bearer {token}"}
+                headers=auth_headers
             )
             assert me_response_after.status_code == 401
     
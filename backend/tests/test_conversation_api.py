@@ -549,11 +549,12 @@ class TestConversationAPI:
                 "password": "password"
             })
             token = login_response.json()["access_token"]
+            auth_headers = {"Authorization": f"Bearer {token}"}
             
             # List all conversations
             response = await client.get(
                 "/api/conversations/",
-                headers={"Authorization": f"Bearer {token}"}
+                headers=auth_headers
             )
             
             assert response.status_code == 200
@@ -567,7 +568,7 @@ class TestConversationAPI:
             # Test public_only filter
             public_response = await client.get(
                 "/api/conversations/?public_only=true",
-                headers={"Authorization": f"Bearer {token}"}
+                headers=auth_headers
             )
             
             assert public_response.status_code == 200
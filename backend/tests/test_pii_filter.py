@@ -1,6 +1,15 @@
+import re
+from collections import Counter
 import pytest
 from app.services.pii_filter import PIIFilter
 
+_TOKEN_RE = re.compile(r"\[(email|phone|link|address)\]")
+
+
+def placeholder_counts(filtered: str) -> Counter:
+    """Count every PII placeholder in one pass over the filtered text."""
+    return Counter(_TOKEN_RE.findall(filtered))
+
 
 class TestPIIFilter:
     """Test cases for PII (Personally Identifiable Information) filtering."""
@@ -21,7 +30,7 @@ class TestPIIFilter:
         filtered = filter.filter_text(text)
         assert "jane@test.com" not in filtered
         assert "admin@site.org" not in filtered
-        assert filtered.count("[email]") == 2
+        assert placeholder_counts(filtered)["email"] == 2
     
     def test_filter_phone_numbers(self):
         """Test that phone numbers are properly filtered."""
@@ -47,7 +56,7 @@ class TestPIIFilter:
         filtered = filter.filter_text(text)
         assert "https://example.com" not in filtered
         assert "http://test.org" not in filtered
-        assert filtered.count("[link]") == 2
+        assert placeholder_counts(filtered)["link"] == 2
         
         # URL with path
         text = "Check out https://github.com/user/repo for the code"
@@ -98,6 +107,17 @@ class TestPIIFilter:
         assert filter.filter_text(None) == ""
         assert filter.filter_text("   ") == "   "
     
+    def test_text_without_pii_markers_unchanged(self):
+        """Test that text with no '@', '://' or digits passes through untouched."""
+        filter = PIIFilter()
+        
+        text = "Python decorators wrap a function to extend its behavior"
+        assert filter.filter_text(text) is text
+        
+        # A single digit is enough to run the full pipeline
+        assert filter.filter_text("Call 5551234567 today") == "Call [phone] today"
+        assert filter.filter_text("Visit HTTPS://Example.com now") == "Visit [link] now"
+    
     def test_mixed_pii_types(self):
         """Test filtering text with multiple types of PII."""
         filter = PIIFilter()
@@ -108,10 +128,11 @@ class TestPIIFilter:
         
         filtered = filter.filter_text(text)
         
-        assert "[email]" in filtered
-        assert "[phone]" in filtered
-        assert "[link]" in filtered
-        assert "[address]" in filtered
+        counts = placeholder_counts(filtered)
+        assert counts["email"] >= 1
+        assert counts["phone"] >= 1
+        assert counts["link"] >= 1
+        assert counts["address"] >= 1
         assert "john.smith@email.com" not in filtered
         assert "555-1234" not in filtered
     
@@ -0,0 +1,92 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+from app.services.presence_manager import PresenceManager
+from app.services.websocket_manager import websocket_manager
+
+
+class TestPresenceBatching:
+    """Test that presence events are coalesced into batched broadcasts."""
+
+    @pytest.mark.asyncio
+    async def test_single_event_sent_as_presence_update(self, monkeypatch):
+        """Test that a lone presence event keeps the presence_update frame shape."""
+        mock_broadcast = AsyncMock(return_value=1)
+        monkeypatch.setattr(websocket_manager, "broadcast_to_conversation", mock_broadcast)
+
+        manager = PresenceManager()
+        await manager.user_joined_conversation(1, 10, "alice")
+        await manager.flush_presence_events(1)
+
+        mock_broadcast.assert_called_once()
+        conversation_id, message = mock_broadcast.call_args.args
+        assert conversation_id == 1
+        assert message["type"] == "presence_update"
+        assert message["action"] == "joined"
+        assert message["user_id"] == 10
+
+    @pytest.mark.asyncio
+    async def test_burst_of_events_sent_as_one_batch(self, monkeypatch):
+        """Test that events within the batching window go out in one presence_batch frame."""
+        mock_broadcast = AsyncMock(return_value=1)
+        monkeypatch.setattr(websocket_manager, "broadcast_to_conversation", mock_broadcast)
+
+        manager = PresenceManager()
+        await manager.user_joined_conversation(1, 10, "alice")
+        await manager.user_joined_conversation(1, 11, "bob")
+        await manager.user_left_conversation(1, 10)
+        mock_broadcast.assert_not_called()
+
+        await manager.flush_presence_events(1)
+
+        mock_broadcast.assert_called_once()
+        message = mock_broadcast.call_args.args[1]
+        assert message["type"] == "presence_batch"
+        assert [event["action"] for event in message["events"]] == ["joined", "joined", "left"]
+        assert manager.get_stats()["pending_presence_events"] == 0
+
+    @pytest.mark.asyncio
+    async def test_full_batch_flushes_immediately(self, monkeypatch):
+        """Test that reaching max_batch_size broadcasts without waiting for the window."""
+        mock_broadcast = AsyncMock(return_value=1)
+        monkeypatch.setattr(websocket_manager, "broadcast_to_conversation", mock_broadcast)
+
+        manager = PresenceManager(flush_interval=60, max_batch_size=3)
+        for user_id in range(3):
+            await manager.user_joined_conversation(1, user_id, f"user{user_id}")
+
+        mock_broadcast.assert_called_once()
+        assert len(mock_broadcast.call_args.args[1]["events"]) == 3
+        assert 1 not in manager._flush_tasks
+
+    @pytest.mark.asyncio
+    async def test_last_participant_leaving_flushes_immediately(self, monkeypatch):
+        """Test that an emptied conversation does not leave a scheduled flush behind."""
+        mock_broadcast = AsyncMock(return_value=1)
+        monkeypatch.setattr(websocket_manager, "broadcast_to_conversation", mock_broadcast)
+
+        manager = PresenceManager(flush_interval=60)
+        await manager.user_joined_conversation(1, 10, "alice")
+        await manager.user_left_conversation(1, 10)
+
+        mock_broadcast.assert_called_once()
+        assert [event["action"] for event in mock_broadcast.call_args.args[1]["events"]] == ["joined", "left"]
+        assert manager._flush_tasks == {}
+
+    @pytest.mark.asyncio
+    async def test_shutdown_flushes_pending_events(self, monkeypatch):
+        """Test that shutdown sends queued events and cancels their timers."""
+        mock_broadcast = AsyncMock(return_value=1)
+        monkeypatch.setattr(websocket_manager, "broadcast_to_conversation", mock_broadcast)
+
+        manager = PresenceManager(flush_interval=60)
+        await manager.user_joined_conversation(1, 10, "alice")
+        await manager.user_joined_conversation(2, 11, "bob")
+        flush_tasks = list(manager._flush_tasks.values())
+
+        await manager.shutdown()
+        await asyncio.sleep(0)
+
+        assert mock_broadcast.call_count == 2
+        assert manager._flush_tasks == {}
+        assert all(task.done() for task in flush_tasks)
@@ -18,7 +18,8 @@ class MockEmbeddingFunction:
         # Handle both list and single string inputs
         if isinstance(input, str):
             input = [input]
-        return [[len(text) * 0.01 for _ in range(384)] for text in input]
+        # Repeat one float per row instead of evaluating it 384 times
+        return [[len(text) * 0.01] * 384 for text in input]
     
     def name(self):
         """Return the name of the embedding function for ChromaDB compatibility."""
@@ -33,4 +34,8 @@ ef.DefaultEmbeddingFunction = lambda **kwargs: MockEmbeddingFunction()
 
 # Also patch the direct import paths
 sys.modules['chromadb.utils.embedding_functions'].OpenAIEmbeddingFunction = lambda **kwargs: MockEmbeddingFunction()
-sys.modules['chromadb.utils.embedding_functions'].DefaultEmbeddingFunction = lambda **kwargs: MockEmbeddingFunction()
\ No newline at end of file
+sys.modules['chromadb.utils.embedding_functions'].DefaultEmbeddingFunction = lambda **kwargs: MockEmbeddingFunction()
+# Use bcrypt's minimum cost factor in tests; the default (12) costs ~250ms
+# per hash/verify and dominates tests that create users and log in
+from app.models.core import pwd_context
+pwd_context.update(bcrypt__rounds=4)
@@ -10,6 +10,16 @@ from app.models import (
 )
 
 
+def _frozen_datetime(now):
+    """Return a datetime subclass whose utcnow() always returns ``now``."""
+    class FrozenDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return now
+    
+    return FrozenDatetime
+
+
 class TestFollowModel:
     """Test Follow model functionality."""
     
@@ -37,12 +47,10 @@ class TestFollowModel:
         db_session.add(follow1)
         await db_session.commit()
         
-        # Try to create duplicate follow
-        follow2 = Follow(follower_id=alice.id, following_id=bob.id)
-        db_session.add(follow2)
-        
+        # Try to create duplicate follow; only the savepoint is rolled back
         with pytest.raises(IntegrityError):
-            await db_session.commit()
+            async with db_session.begin_nested():
+                db_session.add(Follow(follower_id=alice.id, following_id=bob.id))
     
     @pytest.mark.asyncio
     async def test_follow_relationships(self, db_session, test_users):
@@ -52,7 +60,6 @@ class TestFollowModel:
         follow = Follow(follower_id=alice.id, following_id=bob.id)
         db_session.add(follow)
         await db_session.commit()
-        await db_session.refresh(follow)
         
         assert follow.follower.username == alice.username
         assert follow.following.username == bob.username
@@ -88,12 +95,10 @@ class TestSavedConversationModel:
         db_session.add(saved1)
         await db_session.commit()
         
-        # Try to save same conversation again
-        saved2 = SavedConversation(user_id=test_user.id, conversation_id=test_conversation.id)
-        db_session.add(saved2)
-        
+        # Try to save same conversation again; only the savepoint is rolled back
         with pytest.raises(IntegrityError):
-            await db_session.commit()
+            async with db_session.begin_nested():
+                db_session.add(SavedConversation(user_id=test_user.id, conversation_id=test_conversation.id))
     
     @pytest.mark.asyncio
     async def test_saved_conversation_relationships(self, db_session, test_user, test_conversation):
@@ -101,7 +106,6 @@ class TestSavedConversationModel:
         saved = SavedConversation(user_id=test_user.id, conversation_id=test_conversation.id)
         db_session.add(saved)
         await db_session.commit()
-        await db_session.refresh(saved)
         
         assert saved.user.username == test_user.username
         assert saved.conversation.title == test_conversation.title
@@ -142,21 +146,23 @@ class TestCollectionModel:
         await db_session.flush()  # Get collection ID
         
         # Add items to collection
-        for i, conversation in enumerate(test_conversations[:3]):
-            item = CollectionItem(
+        db_session.add_all([
+            CollectionItem(
                 collection_id=collection.id,
                 conversation_id=conversation.id,
                 order_index=i
             )
-            db_session.add(item)
-        
+            for i, conversation in enumerate(test_conversations[:3])
+        ])
         await db_session.commit()
         await db_session.refresh(collection)
         
         # Check collection items count through a separate query to avoid lazy loading issues
         from sqlalchemy import select
         result = await db_session.execute(
-            select(CollectionItem).where(CollectionItem.collection_id == collection.id)
+            select(CollectionItem)
+            .where(CollectionItem.collection_id == collection.id)
+            .order_by(CollectionItem.order_index)
         )
         items = result.scalars().all()
         
@@ -187,8 +193,12 @@ class TestHumanMessageModel:
         assert message.sent_at is not None
         assert message.expires_at is not None
     
-    def test_human_message_expiration(self, test_user, test_conversation):
+    def test_human_message_expiration(self, test_user, test_conversation, monkeypatch):
         """Test human message expiration logic."""
+        # Freeze the model's clock so the default expiry can be checked exactly
+        now = datetime(2025, 1, 1)
+        monkeypatch.setattr("app.models.core.datetime", _frozen_datetime(now))
+        
         message = HumanMessage(
             conversation_id=test_conversation.id,
             user_id=test_user.id,
@@ -196,8 +206,7 @@ class TestHumanMessageModel:
         )
         
         # Should default to 30 days from now
-        expected_expiry = datetime.utcnow() + timedelta(days=30)
-        assert abs((message.expires_at - expected_expiry).total_seconds()) < 60  # Within 1 minute
+        assert message.expires_at == datetime(2025, 1, 31)
         
         # Test is_expired method
         assert not message.is_expired()
@@ -207,7 +216,7 @@ class TestHumanMessageModel:
             conversation_id=test_conversation.id,
             user_id=test_user.id,
             content="Expired message",
-            expires_at=datetime.utcnow() - timedelta(days=1)
+            expires_at=now - timedelta(days=1)
         )
         assert past_message.is_expired()
     
@@ -221,7 +230,6 @@ class TestHumanMessageModel:
         )
         db_session.add(message)
         await db_session.commit()
-        await db_session.refresh(message)
         
         assert message.user.username == test_user.username
         assert message.conversation.title == test_conversation.title
@@ -267,16 +275,14 @@ class TestCollaboratorModel:
         db_session.add(collaborator1)
         await db_session.commit()
         
-        # Try to add same user as collaborator again
-        collaborator2 = Collaborator(
-            conversation_id=test_conversation.id,
-            user_id=bob.id,
-            invited_by_id=alice.id
-        )
-        db_session.add(collaborator2)
-        
+        # Try to add same user as collaborator again; only the savepoint is rolled back
         with pytest.raises(IntegrityError):
-            await db_session.commit()
+            async with db_session.begin_nested():
+                db_session.add(Collaborator(
+                    conversation_id=test_conversation.id,
+                    user_id=bob.id,
+                    invited_by_id=alice.id
+                ))
     
     @pytest.mark.asyncio
     async def test_collaborator_lifecycle(self, db_session, test_users, test_conversation):
@@ -289,14 +295,14 @@ class TestCollaboratorModel:
             invited_by_id=alice.id
         )
         db_session.add(collaborator)
-        await db_session.commit()
+        await db_session.flush()
         
         # Initially not active
         assert not collaborator.is_active()
         
         # Accept invitation
         collaborator.accept_invitation()
-        await db_session.commit()
+        await db_session.flush()
         
         assert collaborator.accepted_at is not None
         assert collaborator.is_active()
@@ -320,7 +326,6 @@ class TestCollaboratorModel:
         )
         db_session.add(collaborator)
         await db_session.commit()
-        await db_session.refresh(collaborator)
         
         assert collaborator.user.username == bob.username
         assert collaborator.invited_by.username == alice.username
@@ -392,7 +397,6 @@ class TestNotificationModel:
         )
         db_session.add(notification)
         await db_session.commit()
-        await db_session.refresh(notification)
         
         assert notification.user.username == alice.username
         assert notification.related_user.username == bob.username
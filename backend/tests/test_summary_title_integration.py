@@ -263,7 +263,7 @@ class TestTitleUpdateErrorHandling:
         """Test that summary service handles title service import failures gracefully."""
         # Create a mock summary service with broken title service import
         class MockSummaryService(SummaryService):
-            async def _update_conversation_title(self, conversation_id: int, summary: str, db: AsyncSession):
+            async def _resolve_conversation_title(self, conversation_id: int, summary: str, db: AsyncSession):
                 # Simulate import failure
                 raise ImportError("Mock import failure")
         
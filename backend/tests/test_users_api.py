@@ -208,11 +208,12 @@ class TestUsersAPI:
                 "password": "password"
             })
             token = login_response.json()["access_token"]
+            auth_headers = {"Authorization": f"Bearer {token}"}
             
             # Test bio too long
             response = await client.put(
                 "/api/users/me/profile",
-                headers={"Authorization": f"Bearer {token}"},
+                headers=auth_headers,
                 json={"bio": "x" * 201}  # Exceeds 200 char limit
             )
             assert response.status_code == 400
@@ -221,7 +222,7 @@ class TestUsersAPI:
             # Test empty display name
             response = await client.put(
                 "/api/users/me/profile",
-                headers={"Authorization": f"Bearer {token}"},
+                headers=auth_headers,
                 json={"display_name": "   "}  # Whitespace only
             )
             assert response.status_code == 400
@@ -230,7 +231,7 @@ class TestUsersAPI:
             # Test display name too long
             response = await client.put(
                 "/api/users/me/profile",
-                headers={"Authorization": f"Bearer {token}"},
+                headers=auth_headers,
                 json={"display_name": "x" * 101}  # Exceeds 100 char limit
             )
             assert response.status_code == 400
@@ -270,11 +271,12 @@ class TestUsersAPI:
                 "password": "password"
             })
             token = login_response.json()["access_token"]
+            auth_headers = {"Authorization": f"Bearer {token}"}
             
             # Get first page of conversations
             response = await client.get(
                 "/api/users/me/conversations?page=1&limit=10",
-                headers={"Authorization": f"Bearer {token}"}
+                headers=auth_headers
             )
             
             assert response.status_code == 200
@@ -288,7 +290,7 @@ class TestUsersAPI:
             # Test filtering
             response = await client.get(
                 "/api/users/me/conversations?include_hidden=false&include_private=false",
-                headers={"Authorization": f"Bearer {token}"}
+                headers=auth_headers
             )
             
             assert response.status_code == 200
@@ -328,11 +330,12 @@ class TestUsersAPI:
                 "password": "password"
             })
             token = login_response.json()["access_token"]
+            auth_headers = {"Authorization": f"Bearer {token}"}
             
             # Hide conversation from profile
             response = await client.put(
                 f"/api/users/me/conversations/{conversation.id}/visibility?is_hidden=true",
-                headers={"Authorization": f"Bearer {token}"}
+                headers=auth_headers
             )
             
             assert response.status_code == 200
@@ -346,7 +349,7 @@ class TestUsersAPI:
             # Show conversation on profile again
             response = await client.put(
                 f"/api/users/me/conversations/{conversation.id}/visibility?is_hidden=false",
-                headers={"Authorization": f"Bearer {token}"}
+                headers=auth_headers
             )
             
             assert response.status_code == 200
@@ -1,10 +1,7 @@
 import pytest
 import json
 import time
-from httpx import AsyncClient, ASGITransport
-from fastapi.testclient import TestClient
 from app.models import User, Conversation, ConversationParticipant, Message
-from app.main import app
 from app.routers.websocket import validate_message_content, is_rate_limited
 from sqlalchemy import select
 
@@ -81,7 +78,7 @@ class TestWebSocketEnhancedMessaging:
     """Test enhanced WebSocket messaging features."""
     
     @pytest.mark.asyncio
-    async def test_message_validation_in_websocket(self, db_session, override_get_db):
+    async def test_message_validation_in_websocket(self, db_session, override_get_db, asgi_websocket, get_token):
         """Test that message validation works in WebSocket context."""
         # Setup
         user = User(
@@ -102,45 +99,39 @@ class TestWebSocketEnhancedMessaging:
         await db_session.commit()
         
         # Get auth token
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
-            login_response = await client.post("/api/auth/login", json={
-                "username": "validator",
-                "password": "password"
-            })
-            token = login_response.json()["access_token"]
+        token = await get_token("validator")
         
         # Test enhanced validation
-        with TestClient(app) as client:
-            with client.websocket_connect(
-                f"/api/ws/conversations/{conversation.id}?token={token}"
-            ) as websocket:
-                # Receive connection established
-                websocket.receive_json()
-                
-                # Test invalid role
-                websocket.send_json({
-                    "type": "send_message",
-                    "content": "Hello",
-                    "role": "invalid_role"
-                })
-                
-                error_data = websocket.receive_json()
-                assert error_data["type"] == "error"
-                assert "Invalid role" in error_data["message"]
-                
-                # Test harmful content
-                websocket.send_json({
-                    "type": "send_message",
-                    "content": "Hello <script>alert('xss')</script>",
-                    "role": "user"
-                })
-                
-                error_data = websocket.receive_json()
-                assert error_data["type"] == "error"
-                assert "harmful code" in error_data["message"]
+        async with asgi_websocket(
+            f"/api/ws/conversations/{conversation.id}?token={token}"
+        ) as websocket:
+            # Receive connection established and our own join
+            await websocket.drain(2)
+            
+            # Test invalid role
+            await websocket.send_json({
+                "type": "send_message",
+                "content": "Hello",
+                "role": "invalid_role"
+            })
+            
+            error_data = await websocket.receive_json()
+            assert error_data["type"] == "error"
+            assert "Invalid role" in error_data["message"]
+            
+            # Test harmful content
+            await websocket.send_json({
+                "type": "send_message",
+                "content": "Hello <script>alert('xss')</script>",
+                "role": "user"
+            })
+            
+            error_data = await websocket.receive_json()
+            assert error_data["type"] == "error"
+            assert "harmful code" in error_data["message"]
     
     @pytest.mark.asyncio
-    async def test_message_history_request(self, db_session, override_get_db):
+    async def test_message_history_request(self, db_session, override_get_db, asgi_websocket, get_token):
         """Test requesting message history via WebSocket."""
         # Setup user and conversation
         user = User(
@@ -175,43 +166,37 @@ class TestWebSocketEnhancedMessaging:
         await db_session.commit()
         
         # Get auth token
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
-            login_response = await client.post("/api/auth/login", json={
-                "username": "history_user",
-                "password": "password"
-            })
-            token = login_response.json()["access_token"]
+        token = await get_token("history_user")
         
         # Test message history request
-        with TestClient(app) as client:
-            with client.websocket_connect(
-                f"/api/ws/conversations/{conversation.id}?token={token}"
-            ) as websocket:
-                # Receive connection established
-                websocket.receive_json()
-                
-                # Request message history
-                websocket.send_json({
-                    "type": "request_message_history",
-                    "limit": 3,
-                    "offset": 0
-                })
-                
-                # Should receive history response
-                history_data = websocket.receive_json()
-                assert history_data["type"] == "message_history"
-                assert len(history_data["messages"]) == 3
-                assert "has_more" in history_data
-                
-                # Check message format
-                first_message = history_data["messages"][0]
-                assert "id" in first_message
-                assert "content" in first_message
-                assert "from_user_username" in first_message
-                assert "timestamp" in first_message
+        async with asgi_websocket(
+            f"/api/ws/conversations/{conversation.id}?token={token}"
+        ) as websocket:
+            # Receive connection established and our own join
+            await websocket.drain(2)
+            
+            # Request message history
+            await websocket.send_json({
+                "type": "request_message_history",
+                "limit": 3,
+                "offset": 0
+            })
+            
+            # Should receive history response
+            history_data = await websocket.receive_json()
+            assert history_data["type"] == "message_history"
+            assert len(history_data["messages"]) == 3
+            assert "has_more" in history_data
+            
+            # Check message format
+            first_message = history_data["messages"][0]
+            assert "id" in first_message
+            assert "content" in first_message
+            assert "from_user_username" in first_message
+            assert "timestamp" in first_message
     
     @pytest.mark.asyncio
-    async def test_mark_messages_read(self, db_session, override_get_db):
+    async def test_mark_messages_read(self, db_session, override_get_db, asgi_websocket, get_token):
         """Test marking messages as read via WebSocket."""
         # Setup
         user = User(
@@ -241,34 +226,28 @@ class TestWebSocketEnhancedMessaging:
         await db_session.commit()
         
         # Get auth token
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
-            login_response = await client.post("/api/auth/login", json={
-                "username": "reader",
-                "password": "password"
-            })
-            token = login_response.json()["access_token"]
+        token = await get_token("reader")
         
         # Test mark messages read
-        with TestClient(app) as client:
-            with client.websocket_connect(
-                f"/api/ws/conversations/{conversation.id}?token={token}"
-            ) as websocket:
-                # Receive connection established
-                websocket.receive_json()
-                
-                # Mark messages as read
-                websocket.send_json({
-                    "type": "mark_messages_read"
-                })
-                
-                # Should receive confirmation
-                read_data = websocket.receive_json()
-                assert read_data["type"] == "messages_marked_read"
-                assert read_data["conversation_id"] == conversation.id
-                assert "timestamp" in read_data
+        async with asgi_websocket(
+            f"/api/ws/conversations/{conversation.id}?token={token}"
+        ) as websocket:
+            # Receive connection established and our own join
+            await websocket.drain(2)
+            
+            # Mark messages as read
+            await websocket.send_json({
+                "type": "mark_messages_read"
+            })
+            
+            # Should receive confirmation
+            read_data = await websocket.receive_json()
+            assert read_data["type"] == "messages_marked_read"
+            assert read_data["conversation_id"] == conversation.id
+            assert "timestamp" in read_data
     
     @pytest.mark.asyncio
-    async def test_visitor_message_notification(self, db_session, override_get_db):
+    async def test_visitor_message_notification(self, db_session, override_get_db, asgi_websocket, get_token):
         """Test visitor message notification to conversation owner."""
         # Setup owner and visitor
         owner = User(
@@ -313,34 +292,23 @@ class TestWebSocketEnhancedMessaging:
         await db_session.commit()
         
         # Get auth tokens
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
-            owner_login = await client.post("/api/auth/login", json={
-                "username": "owner",
-                "password": "password"
-            })
-            owner_token = owner_login.json()["access_token"]
-            
-            visitor_login = await client.post("/api/auth/login", json={
-                "username": "visitor",
-                "password": "password"
-            })
-            visitor_token = visitor_login.json()["access_token"]
+        owner_token = await get_token("owner")
+        visitor_token = await get_token("visitor")
         
-        # Test visitor message creates notification
-        with TestClient(app) as client:
-            with client.websocket_connect(
-                f"/api/ws/conversations/{conversation.id}?token={owner_token}"
-            ) as owner_ws, client.websocket_connect(
+        # Test visitor message creates notification; the visitor socket opens
+        # only once the owner's handler has finished its DB setup
+        async with asgi_websocket(
+            f"/api/ws/conversations/{conversation.id}?token={owner_token}"
+        ) as owner_ws:
+            await owner_ws.receive_until(lambda data: data["type"] == "connection_established")
+            
+            async with asgi_websocket(
                 f"/api/ws/conversations/{conversation.id}?token={visitor_token}"
             ) as visitor_ws:
-                # Clear initial messages
-                owner_ws.receive_json()  # connection_established
-                visitor_ws.receive_json()  # connection_established
-                owner_ws.receive_json()  # user_joined (visitor)
-                visitor_ws.receive_json()  # user_joined (owner)
+                await visitor_ws.receive_until(lambda data: data["type"] == "connection_established")
                 
                 # Visitor sends message
-                visitor_ws.send_json({
+                await visitor_ws.send_json({
                     "type": "send_message",
                     "content": "Hello, I have a question about this conversation",
                     "role": "user",
@@ -348,17 +316,19 @@ class TestWebSocketEnhancedMessaging:
                 })
                 
                 # Owner should receive the regular broadcast
-                message_data = owner_ws.receive_json()
+                message_data = await owner_ws.receive_until(lambda data: data["type"] == "new_message")
                 assert message_data["type"] == "new_message"
                 
-                # Owner should also receive visitor notification
-                notification_data = owner_ws.receive_json()
+                # Owner should also receive visitor notification, skipping any presence frames
+                notification_data = await owner_ws.receive_until(
+                    lambda data: not data["type"].startswith("presence_")
+                )
                 assert notification_data["type"] == "visitor_message_notification"
                 assert notification_data["from_user"] == "visitor"
                 assert "question about this" in notification_data["message_preview"]
-    
+        
     @pytest.mark.asyncio
-    async def test_invalid_message_structure(self, db_session, override_get_db):
+    async def test_invalid_message_structure(self, db_session, override_get_db, asgi_websocket, get_token):
         """Test handling of invalid message structures."""
         # Setup
         user = User(
@@ -379,47 +349,41 @@ class TestWebSocketEnhancedMessaging:
         await db_session.commit()
         
         # Get auth token
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
-            login_response = await client.post("/api/auth/login", json={
-                "username": "struct_test",
-                "password": "password"
-            })
-            token = login_response.json()["access_token"]
+        token = await get_token("struct_test")
         
         # Test invalid message structures
-        with TestClient(app) as client:
-            with client.websocket_connect(
-                f"/api/ws/conversations/{conversation.id}?token={token}"
-            ) as websocket:
-                # Receive connection established
-                websocket.receive_json()
-                
-                # Test message without type
-                websocket.send_json({
-                    "content": "Hello",
-                    "role": "user"
-                })
-                
-                error_data = websocket.receive_json()
-                assert error_data["type"] == "error"
-                assert "Message type is required" in error_data["message"]
-                
-                # Test unknown message type
-                websocket.send_json({
-                    "type": "unknown_type",
-                    "content": "Hello"
-                })
-                
-                error_data = websocket.receive_json()
-                assert error_data["type"] == "error"
-                assert "Unknown message type" in error_data["message"]
+        async with asgi_websocket(
+            f"/api/ws/conversations/{conversation.id}?token={token}"
+        ) as websocket:
+            # Receive connection established and our own join
+            await websocket.drain(2)
+            
+            # Test message without type
+            await websocket.send_json({
+                "content": "Hello",
+                "role": "user"
+            })
+            
+            error_data = await websocket.receive_json()
+            assert error_data["type"] == "error"
+            assert "Message type is required" in error_data["message"]
+            
+            # Test unknown message type
+            await websocket.send_json({
+                "type": "unknown_type",
+                "content": "Hello"
+            })
+            
+            error_data = await websocket.receive_json()
+            assert error_data["type"] == "error"
+            assert "Unknown message type" in error_data["message"]
 
 
 class TestWebSocketParentMessageValidation:
     """Test parent message validation for threading."""
     
     @pytest.mark.asyncio
-    async def test_valid_parent_message(self, db_session, override_get_db):
+    async def test_valid_parent_message(self, db_session, override_get_db, asgi_websocket, get_token):
         """Test threading with valid parent message."""
         # Setup
         user = User(
@@ -450,36 +414,30 @@ class TestWebSocketParentMessageValidation:
         await db_session.commit()
         
         # Get auth token
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
-            login_response = await client.post("/api/auth/login", json={
-                "username": "threader",
-                "password": "password"
-            })
-            token = login_response.json()["access_token"]
+        token = await get_token("threader")
         
         # Test threading with valid parent
-        with TestClient(app) as client:
-            with client.websocket_connect(
-                f"/api/ws/conversations/{conversation.id}?token={token}"
-            ) as websocket:
-                # Receive connection established
-                websocket.receive_json()
-                
-                # Send reply to parent message
-                websocket.send_json({
-                    "type": "send_message",
-                    "content": "This is a reply",
-                    "role": "user",
-                    "parent_message_id": parent_message.id
-                })
-                
-                # Should receive the message successfully
-                message_data = websocket.receive_json()
-                assert message_data["type"] == "new_message"
-                assert message_data["message"]["parent_message_id"] == parent_message.id
+        async with asgi_websocket(
+            f"/api/ws/conversations/{conversation.id}?token={token}"
+        ) as websocket:
+            # Receive connection established and our own join
+            await websocket.drain(2)
+            
+            # Send reply to parent message
+            await websocket.send_json({
+                "type": "send_message",
+                "content": "This is a reply",
+                "role": "user",
+                "parent_message_id": parent_message.id
+            })
+            
+            # Should receive the message successfully
+            message_data = await websocket.receive_json()
+            assert message_data["type"] == "new_message"
+            assert message_data["message"]["parent_message_id"] == parent_message.id
     
     @pytest.mark.asyncio
-    async def test_invalid_parent_message(self, db_session, override_get_db):
+    async def test_invalid_parent_message(self, db_session, override_get_db, asgi_websocket, get_token):
         """Test threading with invalid parent message."""
         # Setup
         user = User(
@@ -500,30 +458,24 @@ class TestWebSocketParentMessageValidation:
         await db_session.commit()
         
         # Get auth token
-        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
-            login_response = await client.post("/api/auth/login", json={
-                "username": "invalid_threader",
-                "password": "password"
-            })
-            token = login_response.json()["access_token"]
+        token = await get_token("invalid_threader")
         
         # Test threading with non-existent parent
-        with TestClient(app) as client:
-            with client.websocket_connect(
-                f"/api/ws/conversations/{conversation.id}?token={token}"
-            ) as websocket:
-                # Receive connection established
-                websocket.receive_json()
-                
-                # Send reply to non-existent parent message
-                websocket.send_json({
-                    "type": "send_message",
-                    "content": "This is a reply to nothing",
-                    "role": "user",
-                    "parent_message_id": 99999  # Non-existent
-                })
-                
-                # Should receive error
-                error_data = websocket.receive_json()
-                assert error_data["type"] == "error"
-                assert "Parent message not found" in error_data["message"]
\ No newline at end of file
+        async with asgi_websocket(
+            f"/api/ws/conversations/{conversation.id}?token={token}"
+        ) as websocket:
+            # Receive connection established and our own join
+            await websocket.drain(2)
+            
+            # Send reply to non-existent parent message
+            await websocket.send_json({
+                "type": "send_message",
+                "content": "This is a reply to nothing",
+                "role": "user",
+                "parent_message_id": 99999  # Non-existent
+            })
+            
+            # Should receive error
+            error_data = await websocket.receive_json()
+            assert error_data["type"] == "error"
+            assert "Parent message not found" in error_data["message"]
\ No newline at end of file
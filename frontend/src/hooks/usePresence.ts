@@ -17,6 +17,12 @@ export function usePresence(conversationId: string | null) {
   const messageViewersRef = useRef<Map<string, PresenceUser[]>>(new Map());
 
   const handlePresenceUpdate = (message: WebSocketMessage) => {
+    if (message.type === 'presence_batch') {
+      // Presence events coalesced by the server into one frame
+      message.events?.forEach(handlePresenceUpdate);
+      return;
+    }
+    
     if (message.type !== 'presence_update' && message.type !== 'scroll_update') return;
     
     if (message.type === 'presence_update') {
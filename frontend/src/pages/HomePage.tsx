@@ -110,7 +110,7 @@ export default function HomePage() {
       } else if (message.type === 'error') {
         setError(message.content || 'An error occurred');
         setIsLoading(false);
-      } else if (message.type === 'presence_update' || message.type === 'scroll_update') {
+      } else if (message.type === 'presence_update' || message.type === 'presence_batch' || message.type === 'scroll_update') {
         // Handle presence and scroll updates
         presenceUpdateHandlerRef.current?.(message);
       } else if (message.type === 'title_updated') {
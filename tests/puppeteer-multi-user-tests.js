@@ -133,14 +133,18 @@ class PresenceTest {
         ws.addEventListener('message', (event) => {
           try {
             const data = JSON.parse(event.data);
-            if (data.type === 'user_joined' || data.type === 'user_left' || data.type === 'presence_update') {
-              window.wsEvents.push({
-                type: data.type,
-                userId: data.userId,
-                timestamp: Date.now()
-              });
-              console.log('Presence event:', data);
-            }
+            // The server coalesces bursts of presence events into one presence_batch frame
+            const frames = data.type === 'presence_batch' ? data.events : [data];
+            frames.forEach((frame) => {
+              if (frame.type === 'user_joined' || frame.type === 'user_left' || frame.type === 'presence_update') {
+                window.wsEvents.push({
+                  type: frame.type,
+                  userId: frame.userId,
+                  timestamp: Date.now()
+                });
+                console.log('Presence event:', frame);
+              }
+            });
           } catch (e) {
             // Ignore non-JSON messages
           }
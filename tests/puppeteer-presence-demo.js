@@ -93,7 +93,7 @@ async function setupWebSocketMonitoring() {
             window.presenceTestData.wsEvents.push(logEntry);
             
             // Special logging for presence events
-            if (['user_joined', 'user_left', 'presence_update', 'typing_start', 'typing_stop'].includes(data.type)) {
+            if (['user_joined', 'user_left', 'presence_update', 'presence_batch', 'typing_start', 'typing_stop'].includes(data.type)) {
               console.log('👥 Presence event:', logEntry);
             } else {
               console.log('📨 Message received:', logEntry);
@@ -537,7 +537,7 @@ async function generateTestReport() {
             return acc;
           }, {}),
           presenceEvents: (testData.wsEvents || []).filter(event => 
-            ['user_joined', 'user_left', 'presence_update', 'typing_start', 'typing_stop'].includes(event.messageType)
+            ['user_joined', 'user_left', 'presence_update', 'presence_batch', 'typing_start', 'typing_stop'].includes(event.messageType)
           )
         },
         userActions: {